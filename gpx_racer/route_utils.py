@@ -2,44 +2,83 @@
 
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Iterable
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import Any, Iterable
+import bisect
+import hashlib
 import math
 
-import gpxpy
+from lxml import etree
+import numpy as np
+
+try:
+    from shapely.geometry import LineString
+except ImportError:  # pragma: no cover - shapely is an optional accelerator
+    LineString = None
+
+try:
+    from sklearn.neighbors import BallTree
+except ImportError:  # pragma: no cover - scikit-learn is an optional accelerator
+    BallTree = None
 
 Point = tuple[float, float]
 
+EARTH_RADIUS_M = 6_371_000
+DISPLAY_TOLERANCE_DEG = 1e-4
+
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, eq=False)
 class RouteData:
-    """Represent route coordinates and cumulative progress values."""
+    """Represent route coordinates and cumulative progress values.
 
-    points: list[Point]
+    Coordinates are stored as an (N, 2) float64 lat/lon array, with
+    the same values in radians and the latitude cosines kept alongside so
+    distance calculations do not repeat that trig. display_points is a
+    simplified copy of the line for drawing on the map, with display_progress
+    holding the route progress of each of its vertices.
+    """
+
+    points_latlon: np.ndarray
     cumulative_m: list[float]
     progress: list[float]
+    center: Point
+    route_id: str
+    lat_rad: np.ndarray = field(repr=False)
+    lon_rad: np.ndarray = field(repr=False)
+    cos_lat: np.ndarray = field(repr=False)
+    display_points: np.ndarray = field(repr=False)
+    display_progress: np.ndarray = field(repr=False)
+    ball_tree: Any = field(default=None, repr=False, compare=False)
+
+    @property
+    def points(self) -> list[Point]:
+        """Return the coordinates as a list of (lat, lon) tuples."""
+        return [tuple(point) for point in self.points_latlon.tolist()]
 
 
-def parse_gpx_points(gpx_text: str) -> list[Point]:
-    """Parse all track and route points from GPX text."""
-    parsed = gpxpy.parse(gpx_text)
-    points: list[Point] = []
+def parse_gpx_points(gpx_bytes: bytes) -> np.ndarray:
+    """Parse all track and route points from GPX file contents.
 
-    for track in parsed.tracks:
-        for segment in track.segments:
-            for point in segment.points:
-                points.append((point.latitude, point.longitude))
+    Returns an (N, 2) float64 array of lat/lon rows.
+    """
+    track_points: list[Point] = []
+    route_points: list[Point] = []
 
-    for route in parsed.routes:
-        for point in route.points:
-            points.append((point.latitude, point.longitude))
+    for _event, element in etree.iterparse(BytesIO(gpx_bytes), tag=("{*}trkpt", "{*}rtept")):
+        target = track_points if etree.QName(element).localname == "trkpt" else route_points
+        target.append((float(element.get("lat")), float(element.get("lon"))))
+        element.clear()
 
-    deduped: list[Point] = []
-    for point in points:
-        if not deduped or point != deduped[-1]:
-            deduped.append(point)
+    points = np.array(track_points + route_points, dtype=np.float64).reshape(-1, 2)
+    keep = np.ones(len(points), dtype=bool)
+    keep[1:] = np.any(points[1:] != points[:-1], axis=1)
+    return points[keep]
 
-    return deduped
+
+def _meters_from_a(a: float) -> float:
+    """Convert a haversine term into great-circle meters."""
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
 
 
 def haversine_m(point_a: Point, point_b: Point) -> float:
@@ -54,85 +93,210 @@ def haversine_m(point_a: Point, point_b: Point) -> float:
         math.sin(delta_phi / 2) ** 2
         + math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2) ** 2
     )
-    return 2 * 6_371_000 * math.asin(math.sqrt(a))
+    return _meters_from_a(a)
+
+
+def _haversine_a(
+    lat1: float,
+    lon1: float,
+    cos_lat1: float,
+    lat2: np.ndarray,
+    lon2: np.ndarray,
+    cos_lat2: np.ndarray,
+) -> np.ndarray:
+    """Compute the haversine term a element-wise, with coordinates in radians.
+
+    a grows monotonically with distance, so callers that only rank candidates
+    can compare it directly and skip the asin/sqrt conversion to meters.
+    """
+    return (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + cos_lat1 * cos_lat2 * np.sin((lon2 - lon1) / 2) ** 2
+    )
 
 
-def build_route_data(points: Iterable[Point]) -> RouteData:
+def _cumulative(lat: np.ndarray, lon: np.ndarray, cos_lat: np.ndarray) -> np.ndarray:
+    """Compute cumulative meters along consecutive points given in radians."""
+    a = _haversine_a(lat[:-1], lon[:-1], cos_lat[:-1], lat[1:], lon[1:], cos_lat[1:])
+    cumulative = np.zeros(lat.shape[0])
+    cumulative[1:] = np.cumsum(2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a)))
+    return cumulative
+
+
+def _display_indices(coords: np.ndarray) -> np.ndarray:
+    """Return the indices kept by a Douglas-Peucker simplification of a lat/lon line."""
+    every_index = np.arange(len(coords))
+    if LineString is None:
+        return every_index
+    simplified = LineString(coords).simplify(DISPLAY_TOLERANCE_DEG, preserve_topology=False)
+
+    # Simplified vertices are an ordered subset of the input, so walk both
+    # lines together to recover where each kept vertex came from.
+    rows = coords.tolist()
+    indices: list[int] = []
+    index = 0
+    for vertex in np.asarray(simplified.coords).tolist():
+        while index < len(rows) and rows[index] != vertex:
+            index += 1
+        if index == len(rows):
+            return every_index
+        indices.append(index)
+        index += 1
+    return np.array(indices, dtype=np.intp)
+
+
+def build_route_data(points: np.ndarray | Iterable[Point]) -> RouteData:
     """Build route data with cumulative meters and normalized progress."""
-    point_list = list(points)
-    if len(point_list) < 2:
+    if not isinstance(points, np.ndarray):
+        points = list(points)
+    coords = np.array(points, dtype=np.float64).reshape(-1, 2)
+    if len(coords) < 2:
         raise ValueError("A route needs at least 2 points.")
+    coords.setflags(write=False)
 
-    cumulative = [0.0]
-    for index in range(1, len(point_list)):
-        step_m = haversine_m(point_list[index - 1], point_list[index])
-        cumulative.append(cumulative[-1] + step_m)
+    lat = np.radians(coords[:, 0])
+    lon = np.radians(coords[:, 1])
+    cos_lat = np.cos(lat)
+    cumulative = _cumulative(lat, lon, cos_lat)
 
-    total = cumulative[-1]
+    total = float(cumulative[-1])
     if total <= 0:
         raise ValueError("Route has zero distance.")
 
-    progress = [value / total for value in cumulative]
-    return RouteData(points=point_list, cumulative_m=cumulative, progress=progress)
+    progress = cumulative / total
+    display_index = _display_indices(coords)
+    ball_tree = None
+    if BallTree is not None:
+        ball_tree = BallTree(np.column_stack((lat, lon)), metric="haversine")
+
+    return RouteData(
+        points_latlon=coords,
+        cumulative_m=cumulative.tolist(),
+        progress=progress.tolist(),
+        center=tuple(coords.mean(axis=0).tolist()),
+        route_id=hashlib.blake2b(coords.tobytes(), digest_size=16).hexdigest(),
+        lat_rad=lat,
+        lon_rad=lon,
+        cos_lat=cos_lat,
+        display_points=coords[display_index],
+        display_progress=progress[display_index],
+        ball_tree=ball_tree,
+    )
+
+
+def _bisect_with_hint(values: list[float], target: float, hint: int | None) -> int:
+    """Return bisect_left of target, probing just past hint before searching."""
+    size = len(values)
+    if hint is not None and 0 <= hint < size and (hint == 0 or values[hint - 1] < target):
+        for index in range(hint, min(hint + 3, size)):
+            if target <= values[index]:
+                return index
+    return bisect.bisect_left(values, target)
+
+
+def _index_for_progress(route: RouteData, progress: float, hint: int | None = None) -> int:
+    """Binary search the nearest index for a normalized progress [0, 1]."""
+    target = min(max(progress, 0.0), 1.0)
+    index = _bisect_with_hint(route.progress, target, hint)
+    if index == 0:
+        return 0
+    if index == len(route.progress):
+        return len(route.progress) - 1
+    if route.progress[index] - target < target - route.progress[index - 1]:
+        return index
+    return index - 1
 
 
 def point_at_progress(route: RouteData, progress: float) -> Point:
     """Return the nearest route point at a normalized progress [0, 1]."""
-    target = min(max(progress, 0.0), 1.0)
-    best_idx = 0
-    best_dist = abs(route.progress[0] - target)
+    return tuple(route.points_latlon[_index_for_progress(route, progress)].tolist())
 
-    for index, value in enumerate(route.progress):
-        diff = abs(value - target)
-        if diff < best_dist:
-            best_dist = diff
-            best_idx = index
 
-    return route.points[best_idx]
+def index_at_progress(route: RouteData, progress: float, hint: int | None = None) -> int:
+    """Return the nearest index for a normalized progress [0, 1].
 
+    When hint is a previously returned index and progress has only moved a
+    little forward, the lookup finishes in a few comparisons.
+    """
+    return _index_for_progress(route, progress, hint)
 
-def index_at_progress(route: RouteData, progress: float) -> int:
-    """Return the nearest index for a normalized progress [0, 1]."""
-    target = min(max(progress, 0.0), 1.0)
-    best_idx = 0
-    best_dist = abs(route.progress[0] - target)
 
-    for index, value in enumerate(route.progress):
-        diff = abs(value - target)
-        if diff < best_dist:
-            best_dist = diff
-            best_idx = index
+def interpolate_at_progress(
+    route: RouteData, progress: float, hint: int | None = None
+) -> tuple[Point, int]:
+    """Return the point at a normalized progress [0, 1], interpolated by distance.
 
-    return best_idx
+    The second value is the index of the segment end point; passing it back
+    as hint on the next call keeps steadily advancing lookups cheap.
+    """
+    target_m = min(max(progress, 0.0), 1.0) * route.cumulative_m[-1]
+    index = _bisect_with_hint(route.cumulative_m, target_m, hint)
+    if index == 0:
+        return tuple(route.points_latlon[0].tolist()), 0
+    index = min(index, len(route.cumulative_m) - 1)
+
+    start_m = route.cumulative_m[index - 1]
+    span_m = route.cumulative_m[index] - start_m
+    fraction = (target_m - start_m) / span_m if span_m > 0 else 1.0
+    start = route.points_latlon[index - 1]
+    end = route.points_latlon[index]
+    return tuple((start + fraction * (end - start)).tolist()), index
 
 
 def closest_index(target: Point, route: RouteData) -> int:
-    """Return the index of the closest route point to target."""
-    best_idx = 0
-    best_dist = haversine_m(target, route.points[0])
-    for index, point in enumerate(route.points):
-        distance = haversine_m(target, point)
-        if distance < best_dist:
-            best_dist = distance
-            best_idx = index
-    return best_idx
+    """Return the index of the closest route point to target.
+
+    The haversine term a grows with distance, so its argmin is the closest
+    point without finishing the asin/sqrt conversion to meters.
+    """
+    target_lat = math.radians(target[0])
+    a = _haversine_a(
+        target_lat,
+        math.radians(target[1]),
+        math.cos(target_lat),
+        route.lat_rad,
+        route.lon_rad,
+        route.cos_lat,
+    )
+    return int(np.argmin(a))
+
+
+def closest_index_fast(target: Point, route: RouteData) -> int:
+    """Return the index of the closest route point using an equirectangular projection.
+
+    Over route-sized distances the projection ranks points the same way as
+    haversine, at the cost of a single cosine per call.
+    """
+    target_lat = math.radians(target[0])
+    target_lon = math.radians(target[1])
+    delta_lon = (route.lon_rad - target_lon + math.pi) % (2 * math.pi) - math.pi
+    d_squared = (delta_lon * math.cos(target_lat)) ** 2 + (route.lat_rad - target_lat) ** 2
+    return int(np.argmin(d_squared))
+
+
+def _nearest_points(route_a: RouteData, route_b: RouteData) -> tuple[np.ndarray, np.ndarray]:
+    """Return the closest route_b index and haversine term a for each route_a point."""
+    if route_b.ball_tree is not None:
+        angles, indices = route_b.ball_tree.query(np.radians(route_a.points_latlon), k=1)
+        return indices.ravel(), np.sin(angles.ravel() / 2) ** 2
+
+    indices = np.array([closest_index_fast(point, route_b) for point in route_a.points])
+    a = _haversine_a(
+        route_a.lat_rad,
+        route_a.lon_rad,
+        route_a.cos_lat,
+        route_b.lat_rad[indices],
+        route_b.lon_rad[indices],
+        route_b.cos_lat[indices],
+    )
+    return indices, a
 
 
 def earliest_alignment(route_a: RouteData, route_b: RouteData) -> tuple[int, int, float]:
     """Find an early pair of route indices that are geographically close."""
-    best_i = 0
-    best_j = closest_index(route_a.points[0], route_b)
-    best_dist = haversine_m(route_a.points[0], route_b.points[best_j])
-    best_score = route_a.progress[0] + route_b.progress[best_j]
-
-    for i, point in enumerate(route_a.points):
-        j = closest_index(point, route_b)
-        dist = haversine_m(point, route_b.points[j])
-        score = route_a.progress[i] + route_b.progress[j]
-
-        if score < best_score or (math.isclose(score, best_score) and dist < best_dist):
-            best_i, best_j = i, j
-            best_dist = dist
-            best_score = score
-
-    return best_i, best_j, best_dist
+    indices_b, a = _nearest_points(route_a, route_b)
+    scores = np.asarray(route_a.progress) + np.asarray(route_b.progress)[indices_b]
+
+    candidates = np.flatnonzero(np.isclose(scores, scores.min(), rtol=1e-9, atol=0.0))
+    best_i = int(candidates[np.argmin(a[candidates])])
+    return best_i, int(indices_b[best_i]), _meters_from_a(float(a[best_i]))
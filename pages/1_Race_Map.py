@@ -2,23 +2,125 @@
 
 from __future__ import annotations
 
+import copy
+import json
 import time
 
 import folium
+import numpy as np
 import streamlit as st
+from folium.template import Template
 from streamlit.runtime.uploaded_file_manager import UploadedFile
 from streamlit_folium import st_folium
 
 from gpx_racer.route_utils import (
+    Point,
     RouteData,
     build_route_data,
-    closest_index,
+    closest_index_fast,
     earliest_alignment,
+    interpolate_at_progress,
     parse_gpx_points,
 )
 
 ROUTE_1_COLOR = "#D1495B"
 ROUTE_2_COLOR = "#00798C"
+PROGRESS_TOLERANCE = 1e-6
+AUTOPLAY_DURATION_S = 60.0
+COORD_DECIMALS = 6
+PROGRESS_DECIMALS = 7
+
+
+def to_json_values(values: np.ndarray, decimals: int) -> list:
+    """Round display values so they serialize as short JSON numbers."""
+    return np.round(values, decimals).tolist()
+
+
+class RaceAnimation(folium.MacroElement):
+    """Move the race dots in the browser until they reach the route ends.
+
+    Each track carries its display polyline, the route progress of every
+    vertex and the progress to start from, so the browser can interpolate
+    positions the same way the server does without any reruns.
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+        (function() {
+            const tracks = {{ this.tracks_json }};
+            const markers = [{% for marker in this.markers %}{{ marker.get_name() }},{% endfor %}];
+            const durationMs = {{ this.duration_ms }};
+            const startedAt = performance.now();
+
+            function positionAt(track, progress) {
+                let low = 0;
+                let high = track.progress.length - 1;
+                while (low < high) {
+                    const mid = (low + high) >> 1;
+                    if (track.progress[mid] < progress) {
+                        low = mid + 1;
+                    } else {
+                        high = mid;
+                    }
+                }
+                if (low === 0) {
+                    return track.points[0];
+                }
+                const startProgress = track.progress[low - 1];
+                const span = track.progress[low] - startProgress;
+                const fraction = span > 0 ? (progress - startProgress) / span : 1;
+                const start = track.points[low - 1];
+                const end = track.points[low];
+                return [
+                    start[0] + fraction * (end[0] - start[0]),
+                    start[1] + fraction * (end[1] - start[1]),
+                ];
+            }
+
+            function frame(now) {
+                // Stop once a rerun has replaced these markers on the map.
+                if (!markers.every(function(marker) { return marker._map; })) {
+                    return;
+                }
+                const ratio = Math.min((now - startedAt) / durationMs, 1);
+                tracks.forEach(function(track, index) {
+                    const progress = track.start + (1 - track.start) * ratio;
+                    markers[index].setLatLng(positionAt(track, progress));
+                });
+                if (ratio < 1) {
+                    window.gpxRacerFrame = window.requestAnimationFrame(frame);
+                }
+            }
+
+            if (window.gpxRacerFrame) {
+                window.cancelAnimationFrame(window.gpxRacerFrame);
+            }
+            window.gpxRacerFrame = window.requestAnimationFrame(frame);
+        })();
+        {% endmacro %}
+        """
+    )
+
+    def __init__(
+        self,
+        tracks: list[tuple[RouteData, float, folium.CircleMarker]],
+        duration_s: float,
+    ) -> None:
+        super().__init__()
+        self._name = "RaceAnimation"
+        self.markers = [marker for _route, _progress, marker in tracks]
+        self.tracks_json = json.dumps(
+            [
+                {
+                    "points": to_json_values(route.display_points, COORD_DECIMALS),
+                    "progress": to_json_values(route.display_progress, PROGRESS_DECIMALS),
+                    "start": progress,
+                }
+                for route, progress, _marker in tracks
+            ]
+        )
+        self.duration_ms = max(duration_s * 1000.0, 1.0)
 
 
 def ensure_state() -> None:
@@ -35,6 +137,8 @@ def ensure_state() -> None:
         "autoplay_start_ts": None,
         "autoplay_from_route_1": 0.0,
         "autoplay_from_route_2": 0.0,
+        "route_1_idx_hint": 0,
+        "route_2_idx_hint": 0,
     }
     for key, value in defaults.items():
         st.session_state.setdefault(key, value)
@@ -55,26 +159,25 @@ def recompute_sync_progress() -> None:
 
 def sync_if_slider_changed() -> None:
     """Apply synchronized slider changes to both routes."""
+    stop_autoplay()
     current = clamp_progress(st.session_state.sync_progress_ui)
-    previous = st.session_state.sync_progress_prev
-    if abs(current - previous) > 1e-9:
-        st.session_state.route_1_progress = current
-        st.session_state.route_2_progress = current
+    if abs(current - st.session_state.sync_progress_prev) < PROGRESS_TOLERANCE:
+        return
+    st.session_state.route_1_progress = current
+    st.session_state.route_2_progress = current
     st.session_state.sync_progress = current
     st.session_state.sync_progress_prev = current
 
 
-def progress_to_index(route: RouteData, progress: float) -> int:
-    """Get nearest route index from normalized progress."""
-    target = clamp_progress(progress)
-    nearest_idx = 0
-    nearest_distance = abs(route.progress[0] - target)
-    for idx, route_progress in enumerate(route.progress):
-        distance = abs(route_progress - target)
-        if distance < nearest_distance:
-            nearest_distance = distance
-            nearest_idx = idx
-    return nearest_idx
+def progress_to_point(route: RouteData, progress: float, hint_key: str) -> Point:
+    """Get the interpolated route position for a normalized progress.
+
+    The previous segment index is kept in session state under hint_key so the
+    steadily advancing autoplay lookups avoid a full search.
+    """
+    point, index = interpolate_at_progress(route, progress, st.session_state.get(hint_key))
+    st.session_state[hint_key] = index
+    return point
 
 
 def apply_autoplay() -> None:
@@ -87,7 +190,7 @@ def apply_autoplay() -> None:
         return
 
     elapsed = time.time() - started
-    ratio = min(elapsed / 60.0, 1.0)
+    ratio = min(elapsed / AUTOPLAY_DURATION_S, 1.0)
     from_1 = st.session_state.autoplay_from_route_1
     from_2 = st.session_state.autoplay_from_route_2
 
@@ -99,34 +202,72 @@ def apply_autoplay() -> None:
         st.session_state.autoplay = False
 
 
+def stop_autoplay() -> None:
+    """Settle a running race at its elapsed position and stop it."""
+    apply_autoplay()
+    st.session_state.autoplay = False
+    st.session_state.autoplay_start_ts = None
+
+
+def autoplay_remaining_s() -> float:
+    """Return the seconds left in the running race, or 0.0 when idle."""
+    started = st.session_state.autoplay_start_ts
+    if not st.session_state.autoplay or started is None:
+        return 0.0
+    return max(AUTOPLAY_DURATION_S - (time.time() - started), 0.0)
+
+
 def update_route_1_from_slider() -> None:
     """Update route 1 progress from its slider."""
-    st.session_state.route_1_progress = clamp_progress(st.session_state.route_1_progress_ui)
+    stop_autoplay()
+    new_progress = clamp_progress(st.session_state.route_1_progress_ui)
+    if abs(new_progress - st.session_state.route_1_progress) < PROGRESS_TOLERANCE:
+        return
+    st.session_state.route_1_progress = new_progress
     recompute_sync_progress()
 
 
 def update_route_2_from_slider() -> None:
     """Update route 2 progress from its slider."""
-    st.session_state.route_2_progress = clamp_progress(st.session_state.route_2_progress_ui)
+    stop_autoplay()
+    new_progress = clamp_progress(st.session_state.route_2_progress_ui)
+    if abs(new_progress - st.session_state.route_2_progress) < PROGRESS_TOLERANCE:
+        return
+    st.session_state.route_2_progress = new_progress
     recompute_sync_progress()
 
 
-def render_map(route_1: RouteData, route_2: RouteData) -> None:
-    """Render map with routes and current markers."""
-    idx_1 = progress_to_index(route_1, st.session_state.route_1_progress)
-    idx_2 = progress_to_index(route_2, st.session_state.route_2_progress)
-    dot_1 = route_1.points[idx_1]
-    dot_2 = route_2.points[idx_2]
-
-    all_points = route_1.points + route_2.points
-    center_lat = sum(point[0] for point in all_points) / len(all_points)
-    center_lon = sum(point[1] for point in all_points) / len(all_points)
+@st.cache_resource(show_spinner=False)
+def build_base_map(
+    route_1_id: str, route_2_id: str, _route_1: RouteData, _route_2: RouteData
+) -> folium.Map:
+    """Build the map with both route lines, cached per pair of route ids."""
+    center_lat = (_route_1.center[0] + _route_2.center[0]) / 2
+    center_lon = (_route_1.center[1] + _route_2.center[1]) / 2
     fmap = folium.Map(location=(center_lat, center_lon), zoom_start=12, control_scale=True)
 
-    folium.PolyLine(route_1.points, color=ROUTE_1_COLOR, weight=5, opacity=0.85).add_to(fmap)
-    folium.PolyLine(route_2.points, color=ROUTE_2_COLOR, weight=5, opacity=0.85).add_to(fmap)
+    for route, color in ((_route_1, ROUTE_1_COLOR), (_route_2, ROUTE_2_COLOR)):
+        folium.PolyLine(
+            to_json_values(route.display_points, COORD_DECIMALS),
+            color=color,
+            weight=5,
+            opacity=0.85,
+        ).add_to(fmap)
+    return fmap
+
 
-    folium.CircleMarker(
+def render_map(route_1: RouteData, route_2: RouteData) -> None:
+    """Render map with routes and current markers.
+
+    The route lines come from the cached base map; only the dots are rebuilt
+    and sent as a feature group so the browser keeps the existing map. While
+    a race runs the dots are animated in the browser rather than by reruns.
+    """
+    dot_1 = progress_to_point(route_1, st.session_state.route_1_progress, "route_1_idx_hint")
+    dot_2 = progress_to_point(route_2, st.session_state.route_2_progress, "route_2_idx_hint")
+
+    markers = folium.FeatureGroup(name="Race dots")
+    marker_1 = folium.CircleMarker(
         location=dot_1,
         radius=9,
         color=ROUTE_1_COLOR,
@@ -134,8 +275,8 @@ def render_map(route_1: RouteData, route_2: RouteData) -> None:
         fill_color=ROUTE_1_COLOR,
         fill_opacity=1.0,
         tooltip="Route 1",
-    ).add_to(fmap)
-    folium.CircleMarker(
+    ).add_to(markers)
+    marker_2 = folium.CircleMarker(
         location=dot_2,
         radius=9,
         color=ROUTE_2_COLOR,
@@ -143,16 +284,47 @@ def render_map(route_1: RouteData, route_2: RouteData) -> None:
         fill_color=ROUTE_2_COLOR,
         fill_opacity=1.0,
         tooltip="Route 2",
-    ).add_to(fmap)
+    ).add_to(markers)
+
+    remaining_s = autoplay_remaining_s()
+    if remaining_s > 0:
+        RaceAnimation(
+            [
+                (route_1, st.session_state.route_1_progress, marker_1),
+                (route_2, st.session_state.route_2_progress, marker_2),
+            ],
+            duration_s=remaining_s,
+        ).add_to(markers)
+
+    # st_folium attaches the feature group to the map it renders, so work on a
+    # copy to keep the cached base map free of per-rerun markers.
+    fmap = copy.deepcopy(build_base_map(route_1.route_id, route_2.route_id, route_1, route_2))
+    st_folium(
+        fmap,
+        key="race_map",
+        feature_group_to_add=markers,
+        use_container_width=True,
+        height=560,
+        returned_objects=[],
+    )
+
+
+@st.cache_data(show_spinner=False)
+def build_route_cached(gpx_bytes: bytes) -> RouteData:
+    """Parse GPX bytes into route data, cached on the file contents."""
+    points = parse_gpx_points(gpx_bytes)
+    return build_route_data(points)
+
 
-    st_folium(fmap, use_container_width=True, height=560, returned_objects=[])
+@st.cache_data(show_spinner=False, hash_funcs={RouteData: lambda route: route.route_id})
+def align_routes_cached(route_1: RouteData, route_2: RouteData) -> tuple[int, int, float]:
+    """Find the earliest close pairing, cached per pair of route ids."""
+    return earliest_alignment(route_1, route_2)
 
 
 def try_build_route(uploaded_file: UploadedFile) -> RouteData:
     """Parse uploaded GPX and build route data."""
-    gpx_text = uploaded_file.getvalue().decode("utf-8", errors="ignore")
-    points = parse_gpx_points(gpx_text)
-    return build_route_data(points)
+    return build_route_cached(uploaded_file.getvalue())
 
 
 st.set_page_config(page_title="GPX Race Map", layout="wide")
@@ -180,6 +352,9 @@ except Exception as error:  # pragma: no cover - defensive for malformed files
     st.error(f"Could not parse GPX files: {error}")
     st.stop()
 
+# Settle the race before any input so controls act on where the dots are now.
+apply_autoplay()
+
 with st.sidebar:
     st.header("Race Controls")
     st.session_state.route_1_progress = clamp_progress(st.session_state.route_1_progress)
@@ -220,7 +395,7 @@ with st.sidebar:
 
     col_go, col_stop = st.columns(2)
     with col_go:
-        if st.button("Go (60s)", use_container_width=True):
+        if st.button(f"Go ({AUTOPLAY_DURATION_S:.0f}s)", use_container_width=True):
             st.session_state.autoplay = True
             st.session_state.autoplay_start_ts = time.time()
             st.session_state.autoplay_from_route_1 = clamp_progress(
@@ -231,28 +406,33 @@ with st.sidebar:
             )
     with col_stop:
         if st.button("Stop", use_container_width=True):
-            st.session_state.autoplay = False
-            st.session_state.autoplay_start_ts = None
+            stop_autoplay()
+            st.rerun()
 
     st.divider()
     if st.button("Align dots as early as possible", use_container_width=True):
-        index_1, index_2, distance_m = earliest_alignment(route_1, route_2)
+        stop_autoplay()
+        index_1, index_2, distance_m = align_routes_cached(route_1, route_2)
         st.session_state.route_1_progress = route_1.progress[index_1]
         st.session_state.route_2_progress = route_2.progress[index_2]
         recompute_sync_progress()
         st.caption(f"Closest early pairing distance: {distance_m:.1f} m")
 
     if st.button("Start race from Route 1 position", use_container_width=True):
-        source_index = progress_to_index(route_1, st.session_state.route_1_progress)
-        source_point = route_1.points[source_index]
-        target_index = closest_index(source_point, route_2)
+        stop_autoplay()
+        source_point = progress_to_point(
+            route_1, st.session_state.route_1_progress, "route_1_idx_hint"
+        )
+        target_index = closest_index_fast(source_point, route_2)
         st.session_state.route_2_progress = route_2.progress[target_index]
         recompute_sync_progress()
 
     if st.button("Start race from Route 2 position", use_container_width=True):
-        source_index = progress_to_index(route_2, st.session_state.route_2_progress)
-        source_point = route_2.points[source_index]
-        target_index = closest_index(source_point, route_1)
+        stop_autoplay()
+        source_point = progress_to_point(
+            route_2, st.session_state.route_2_progress, "route_2_idx_hint"
+        )
+        target_index = closest_index_fast(source_point, route_1)
         st.session_state.route_1_progress = route_1.progress[target_index]
         recompute_sync_progress()
 
@@ -260,10 +440,4 @@ with st.sidebar:
     st.write(f"Route 1: {route_1.cumulative_m[-1] / 1000:.2f} km")
     st.write(f"Route 2: {route_2.cumulative_m[-1] / 1000:.2f} km")
 
-apply_autoplay()
-
 render_map(route_1, route_2)
-
-if st.session_state.autoplay:
-    time.sleep(0.10)
-    st.rerun()
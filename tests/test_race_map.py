@@ -0,0 +1,81 @@
+"""Tests for the race map page controls."""
+
+import time
+from pathlib import Path
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+PAGE_PATH = Path(__file__).resolve().parents[1] / "pages" / "1_Race_Map.py"
+AUTOPLAY_DURATION_S = 60.0
+
+
+def _gpx(points: list[tuple[float, float]]) -> bytes:
+    trkpts = "".join(f'<trkpt lat="{lat}" lon="{lon}"/>' for lat, lon in points)
+    return (
+        '<gpx version="1.1" xmlns="http://www.topografix.com/GPX/1/1">'
+        f"<trk><trkseg>{trkpts}</trkseg></trk></gpx>"
+    ).encode()
+
+
+def _race_page(page_path: str, gpx_1: bytes, gpx_2: bytes) -> None:
+    import runpy
+
+    import streamlit as st
+
+    class Upload:
+        def __init__(self, data: bytes) -> None:
+            self.data = data
+
+        def getvalue(self) -> bytes:
+            return self.data
+
+    uploads = {"gpx_1": Upload(gpx_1), "gpx_2": Upload(gpx_2)}
+    file_uploader = st.file_uploader
+    st.file_uploader = lambda label, type=None, key=None: uploads[key]
+    try:
+        runpy.run_path(page_path, run_name="__main__")
+    finally:
+        st.file_uploader = file_uploader
+
+
+def _start_race(app: AppTest, elapsed_s: float) -> None:
+    app.session_state["autoplay"] = True
+    app.session_state["autoplay_start_ts"] = time.time() - elapsed_s
+    app.session_state["autoplay_from_route_1"] = 0.0
+    app.session_state["autoplay_from_route_2"] = 0.0
+
+
+@pytest.fixture
+def app() -> AppTest:
+    route = _gpx([(51.0 + step * 0.001, -1.0) for step in range(20)])
+    app = AppTest.from_function(
+        _race_page, args=(str(PAGE_PATH), route, route), default_timeout=30
+    )
+    app.run()
+    assert not app.exception
+    return app
+
+
+def test_slider_after_finished_race_moves_dot(app: AppTest) -> None:
+    _start_race(app, AUTOPLAY_DURATION_S + 1)
+    app.sidebar.slider[1].set_value(0.3).run()
+    assert not app.session_state["autoplay"]
+    assert app.session_state["route_1_progress"] == pytest.approx(0.3)
+    assert app.session_state["route_2_progress"] == 1.0
+
+
+def test_slider_during_race_stops_it_where_the_dots_are(app: AppTest) -> None:
+    _start_race(app, AUTOPLAY_DURATION_S / 2)
+    app.sidebar.slider[1].set_value(0.3).run()
+    assert not app.session_state["autoplay"]
+    assert app.session_state["route_1_progress"] == pytest.approx(0.3)
+    assert app.session_state["route_2_progress"] == pytest.approx(0.5, abs=0.01)
+
+
+def test_align_after_finished_race_moves_dots(app: AppTest) -> None:
+    _start_race(app, AUTOPLAY_DURATION_S + 1)
+    app.sidebar.button[2].click().run()
+    assert not app.session_state["autoplay"]
+    assert app.session_state["route_1_progress"] == 0.0
+    assert app.session_state["route_2_progress"] == 0.0
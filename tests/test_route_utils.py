@@ -1,20 +1,135 @@
 """Tests for GPX route utility functions."""
 
-from gpx_racer.route_utils import build_route_data, earliest_alignment, haversine_m
+import dataclasses
+import itertools
+import math
+
+import numpy as np
+import pytest
+
+from gpx_racer import route_utils
+from gpx_racer.route_utils import (
+    _display_indices,
+    build_route_data,
+    closest_index,
+    closest_index_fast,
+    earliest_alignment,
+    haversine_m,
+    index_at_progress,
+    interpolate_at_progress,
+    parse_gpx_points,
+)
 
 
 def test_haversine_is_zero_for_identical_points() -> None:
     assert haversine_m((51.0, -1.0), (51.0, -1.0)) == 0.0
 
 
+def test_parse_gpx_points_reads_tracks_then_routes_without_repeats() -> None:
+    gpx = b"""<?xml version="1.0" encoding="UTF-8"?>
+<gpx version="1.1" xmlns="http://www.topografix.com/GPX/1/1">
+  <wpt lat="50.0" lon="-2.0"/>
+  <rte><rtept lat="52.0" lon="-3.0"/></rte>
+  <trk><trkseg>
+    <trkpt lat="51.0" lon="-1.0"><ele>10</ele></trkpt>
+    <trkpt lat="51.0" lon="-1.0"/>
+    <trkpt lat="51.001" lon="-1.001"/>
+  </trkseg></trk>
+</gpx>"""
+    assert parse_gpx_points(gpx).tolist() == [[51.0, -1.0], [51.001, -1.001], [52.0, -3.0]]
+
+
+def test_parse_gpx_points_handles_files_without_points() -> None:
+    gpx = b'<gpx version="1.1" xmlns="http://www.topografix.com/GPX/1/1"/>'
+    assert parse_gpx_points(gpx).shape == (0, 2)
+
+
 def test_route_progress_reaches_one() -> None:
     route = build_route_data([(51.0, -1.0), (51.0005, -1.0005), (51.001, -1.001)])
     assert route.progress[0] == 0.0
     assert route.progress[-1] == 1.0
 
 
+def test_route_cumulative_matches_segment_haversine() -> None:
+    points = [(51.0, -1.0), (51.0005, -1.0005), (51.001, -1.001)]
+    route = build_route_data(points)
+    expected = haversine_m(points[0], points[1]) + haversine_m(points[1], points[2])
+    assert math.isclose(route.cumulative_m[-1], expected)
+
+
 def test_earliest_alignment_prefers_start_when_routes_overlap() -> None:
     route_a = build_route_data([(51.0, -1.0), (51.001, -1.001), (51.002, -1.002)])
     route_b = build_route_data([(51.0, -1.0), (51.004, -1.004), (51.005, -1.005)])
     idx_a, idx_b, _distance = earliest_alignment(route_a, route_b)
     assert (idx_a, idx_b) == (0, 0)
+
+
+def test_earliest_alignment_fallback_matches_ball_tree() -> None:
+    route_a = build_route_data([(51.0 + step * 0.001, -1.0) for step in range(30)])
+    route_b = build_route_data([(51.0205 - step * 0.001, -1.0003) for step in range(30)])
+    expected = earliest_alignment(route_a, route_b)
+    fallback = earliest_alignment(route_a, dataclasses.replace(route_b, ball_tree=None))
+    assert fallback[:2] == expected[:2]
+    assert math.isclose(fallback[2], expected[2], rel_tol=1e-6)
+
+
+def test_index_at_progress_picks_nearest_point() -> None:
+    route = build_route_data([(51.0, -1.0), (51.001, -1.0), (51.002, -1.0), (51.003, -1.0)])
+    assert index_at_progress(route, -0.5) == 0
+    assert index_at_progress(route, 0.3) == 1
+    assert index_at_progress(route, 0.4) == 1
+    assert index_at_progress(route, 0.6) == 2
+    assert index_at_progress(route, 1.5) == 3
+
+
+def test_index_at_progress_hint_matches_full_search() -> None:
+    route = build_route_data([(51.0 + step * 0.0005, -1.0) for step in range(50)])
+    hint = 0
+    for tick in range(101):
+        index = index_at_progress(route, tick / 100, hint)
+        assert index == index_at_progress(route, tick / 100)
+        hint = index
+    assert index_at_progress(route, 0.1, hint=len(route.progress) + 5) == 5
+
+
+def test_closest_index_fast_matches_haversine_ranking() -> None:
+    route = build_route_data([(51.0 + step * 0.001, -1.0 + step * 0.0015) for step in range(40)])
+    for target in [(51.0101, -0.9851), (50.99, -1.01), (51.05, -0.93)]:
+        assert closest_index_fast(target, route) == closest_index(target, route)
+
+
+def test_interpolate_at_progress_moves_between_points() -> None:
+    route = build_route_data([(51.0, -1.0), (51.002, -1.0), (51.004, -1.0)])
+    (lat, lon), index = interpolate_at_progress(route, 0.25)
+    assert math.isclose(lat, 51.001, rel_tol=1e-6)
+    assert lon == -1.0
+    assert index == 1
+    assert interpolate_at_progress(route, 1.0, hint=index)[0] == (51.004, -1.0)
+
+
+def _figure_eight() -> np.ndarray:
+    # Two square loops joined at their shared corner, which the route visits
+    # three times: at the start, at the crossing, and at the finish.
+    corners = np.array(
+        [(0, 0), (10, 0), (10, 10), (0, 10), (0, 0), (-10, 0), (-10, -10), (0, -10), (0, 0)]
+    )
+    fractions = np.arange(10)[:, None] / 10
+    steps = [start + (end - start) * fractions for start, end in itertools.pairwise(corners)]
+    return 51.0 + np.vstack([*steps, corners[-1:]]) * 0.001
+
+
+def test_display_indices_follow_self_crossing_loop() -> None:
+    shapely = pytest.importorskip("shapely")
+    coords = _figure_eight()
+    indices = _display_indices(coords)
+    simplified = shapely.LineString(coords).simplify(
+        route_utils.DISPLAY_TOLERANCE_DEG, preserve_topology=False
+    )
+    assert np.array_equal(coords[indices], np.asarray(simplified.coords))
+    assert indices.tolist() == list(range(0, len(coords), 10))
+
+
+def test_display_indices_keep_every_point_without_shapely(monkeypatch) -> None:
+    monkeypatch.setattr(route_utils, "LineString", None)
+    coords = _figure_eight()
+    assert np.array_equal(_display_indices(coords), np.arange(len(coords)))